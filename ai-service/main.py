@@ -1,43 +1,161 @@
 # CloudGuard AI - Python AI/ML Microservice with TensorFlow
 import os
+
+# Serving precision: "fp32", "int8" or "bf16"
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+
+if MODEL_PRECISION != "fp32":
+    # Intel Extension for TensorFlow: enable mixed precision and keep constant
+    # folding off so oneDNN Graph can fuse the INT8 dense kernels
+    os.environ.setdefault("ITEX_AUTO_MIXED_PRECISION", "1")
+    os.environ.setdefault("ITEX_TF_CONSTANT_FOLDING", "0")
+
+def available_cpus() -> int:
+    """CPUs this process may use: the cgroup CPU limit when set (containers), else the host core count"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2
+            quota, period = f.read().split()
+    except OSError:
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:  # cgroup v1
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = f.read().strip()
+        except OSError:
+            quota, period = "max", "1"
+    
+    cpus = os.cpu_count() or 1
+    if quota not in ("max", "-1"):
+        cpus = min(cpus, max(1, int(quota) // int(period)))
+    return cpus
+
+# Twins, metric windows and model weights live in process memory, so the
+# service runs a single uvicorn worker unless WEB_CONCURRENCY says otherwise.
+# Split the CPU budget between workers so TF thread pools don't oversubscribe
+CPUS = available_cpus()
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+INTRA_OP_THREADS = max(1, CPUS // WORKERS)
+os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(INTRA_OP_THREADS))
+INTRA_OP_THREADS = int(os.environ["TF_NUM_INTRAOP_THREADS"])
+
 import asyncio
-import json
+import hashlib
+import threading
+import time
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import numba
 import pandas as pd
 import tensorflow as tf
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from typing import List, Dict, Optional, Tuple
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Body
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import redis
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 import uvicorn
 from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.client.write_api import WriteOptions
 import logging
 
+try:
+    import onnxruntime as ort
+    import tf2onnx
+except ImportError:  # Fall back to TensorFlow inference graphs
+    ort = None
+    tf2onnx = None
+
+# Pin TensorFlow thread pools before any op runs
+tf.config.threading.set_inter_op_parallelism_threads(int(os.environ["TF_NUM_INTEROP_THREADS"]))
+tf.config.threading.set_intra_op_parallelism_threads(INTRA_OP_THREADS)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if WORKERS > 1:
+    logger.warning(f"Running {WORKERS} workers: digital twins, metric windows and retrained "
+                   "models are not shared between them")
+
+# Lifecycle
+def current_timestamp() -> str:
+    return datetime.now().isoformat(timespec='milliseconds')
+
+async def refresh_timestamp(app: FastAPI):
+    """Keep a ~100ms-granularity ISO timestamp on app.state for responses"""
+    while True:
+        app.state.iso_now = current_timestamp()
+        await asyncio.sleep(0.1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: the clock first so every response has a timestamp, then the batcher
+    app.state.iso_now = current_timestamp()
+    clock_task = asyncio.create_task(refresh_timestamp(app))
+    batcher.start()
+    
+    yield
+    
+    # Shutdown: stop taking inference work, then flush and close connections
+    await batcher.stop()
+    predictor.tf_pool.shutdown(wait=False)
+    clock_task.cancel()
+    await asyncio.gather(clock_task, return_exceptions=True)
+    await asyncio.gather(*pending_cache_writes, return_exceptions=True)
+    await redis_client.aclose()
+    twin_engine.write_api.close()
+
 # Initialize FastAPI app
-app = FastAPI(title="CloudGuard AI - ML Service", version="2.0.0")
+app = FastAPI(
+    title="CloudGuard AI - ML Service",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
 )
 
+# Compress larger payloads (digital twin state grows with predictions);
+# level 1 keeps encode cost low for this CPU-bound service
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=1)
+
 # Initialize connections
-redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
+redis_client = aioredis.Redis(host='localhost', port=6379, decode_responses=True)
+
+# Fire-and-forget cache writes; referenced here so they aren't garbage collected
+pending_cache_writes = set()
+
+def cache_in_background(coro):
+    """Schedule a Redis write without making the response wait for it"""
+    task = asyncio.create_task(coro)
+    pending_cache_writes.add(task)
+    task.add_done_callback(_cache_write_done)
+    return task
+
+def _cache_write_done(task: asyncio.Task):
+    pending_cache_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Cache write failed: {task.exception()}")
+
 influx_client = InfluxDBClient(url="http://localhost:8086", token="admin-token", org="cloudguard")
 
 # Pydantic models
 class MetricData(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     timestamp: datetime
     resource_id: str
     cpu: float
@@ -56,25 +174,115 @@ class DigitalTwinState(BaseModel):
     predictions: Optional[Dict] = None
     accuracy: float = 0.0
 
+def metrics_to_ndarray(metrics: List[MetricData]) -> np.ndarray:
+    """Stack metrics into an (n, 4) float32 array of CPU, Memory, Disk, Network"""
+    return np.fromiter(
+        ((m.cpu, m.memory, m.disk, m.network) for m in metrics),
+        dtype=np.dtype((np.float32, 4)),
+        count=len(metrics)
+    )
+
+MODEL_COMPILE_ARGS = {
+    'performance': dict(optimizer='adam', loss='mse', metrics=['mae']),
+    'anomaly': dict(optimizer='adam', loss='mse'),
+    'cost': dict(optimizer='adam', loss='mse', metrics=['mae'])
+}
+
+# XLA compiles once per concrete batch shape, so batches are padded up to one of these
+INFERENCE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+MAX_BATCH_SIZE = INFERENCE_BUCKETS[-1]
+
+QUANTIZATION_TOLERANCE = 0.03  # Max relative output drift accepted from INT8 weights
+
+def cpu_flags() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+def cpu_supports_int8() -> bool:
+    """Check for CPU instructions that accelerate INT8 matmuls (VNNI / AMX / ARM dot product)"""
+    flags = cpu_flags()
+    return any(flag in flags for flag in ("avx512_vnni", "avx_vnni", "amx_int8", "asimddp"))
+
+def cpu_supports_bf16() -> bool:
+    """Check for native BF16 matmul instructions; without them BF16 is emulated"""
+    flags = cpu_flags()
+    return any(flag in flags for flag in ("avx512_bf16", "amx_bf16"))
+
+# Anomaly scoring kernels (compiled artifacts cached on disk across restarts)
+@numba.njit(cache=True, fastmath=True)
+def anomaly_kernel(input_arr: np.ndarray, recon_arr: np.ndarray) -> float:
+    """Mean squared reconstruction error of one sample"""
+    total = 0.0
+    for i in range(input_arr.shape[0]):
+        diff = input_arr[i] - recon_arr[i]
+        total += diff * diff
+    return total / input_arr.shape[0]
+
+@numba.njit(cache=True, fastmath=True, parallel=True)
+def anomaly_kernel_batch(inputs: np.ndarray, recons: np.ndarray) -> np.ndarray:
+    """Mean squared reconstruction error of each row"""
+    scores = np.empty(inputs.shape[0], dtype=np.float32)
+    for row in numba.prange(inputs.shape[0]):
+        total = 0.0
+        for i in range(inputs.shape[1]):
+            diff = inputs[row, i] - recons[row, i]
+            total += diff * diff
+        scores[row] = total / inputs.shape[1]
+    return scores
+
+# Compile ahead of the first request; the batch kernel compiles on first use so
+# Numba's parallel threading layer only starts when something scores in bulk
+anomaly_kernel(np.zeros(4, dtype=np.float32), np.zeros(4, dtype=np.float32))
+
 # TensorFlow Models
 class CloudMetricsPredictor:
     def __init__(self):
         self.models = {}
+        self.infer = {}
+        self.sessions = {}
+        self.model_version = ""
+        self._training_lock = threading.Lock()
+        # Rolling (10, 4) float32 window of normalized metrics per resource, plus its write head
+        self.windows: Dict[str, np.ndarray] = {}
+        self.window_heads: Dict[str, int] = {}
+        # Pre-drawn confidence values, indexed round-robin instead of calling the RNG per request
+        self._conf_pool = np.random.default_rng(0).random(65536).astype(np.float32) * 0.1 + 0.85
+        self._conf_idx = 0
+        self.precision = MODEL_PRECISION
+        if self.precision == "int8" and not cpu_supports_int8():
+            self.precision = "bf16" if cpu_supports_bf16() else "fp32"
+            logger.info(f"CPU lacks INT8 dot-product instructions, serving in {self.precision.upper()} instead")
+        if self.precision == "bf16" and not cpu_supports_bf16():
+            logger.info("CPU lacks native BF16 instructions, serving in FP32 instead")
+            self.precision = "fp32"
+        if self.precision == "bf16":
+            tf.keras.mixed_precision.set_global_policy('mixed_bfloat16')
         self.create_models()
+        # Inference runs here so it never blocks the event loop. One thread per model
+        # at least, so the batcher loops and predict_all never queue behind each other;
+        # otherwise one core is left for the event loop itself
+        self.tf_pool = ThreadPoolExecutor(
+            max_workers=max(len(self.models), CPUS // WORKERS - 1),
+            thread_name_prefix='tf-infer'
+        )
+        self.build_inference()
     
     def create_models(self):
         """Create TensorFlow models for different prediction types"""
         
         # Performance prediction model
         performance_model = tf.keras.Sequential([
-            tf.keras.layers.Dense(64, activation='relu', input_shape=(10,)),
+            tf.keras.layers.Dense(64, activation='relu', input_shape=(40,)),  # Last 10 samples x 4 metrics
             tf.keras.layers.Dropout(0.2),
             tf.keras.layers.Dense(32, activation='relu'),
             tf.keras.layers.Dropout(0.2),
             tf.keras.layers.Dense(16, activation='relu'),
             tf.keras.layers.Dense(4, activation='sigmoid')  # CPU, Memory, Disk, Network
         ])
-        performance_model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+        performance_model.compile(**MODEL_COMPILE_ARGS['performance'])
         
         # Anomaly detection model (Autoencoder)
         anomaly_model = tf.keras.Sequential([
@@ -85,7 +293,7 @@ class CloudMetricsPredictor:
             tf.keras.layers.Dense(32, activation='relu'),
             tf.keras.layers.Dense(4, activation='sigmoid')
         ])
-        anomaly_model.compile(optimizer='adam', loss='mse')
+        anomaly_model.compile(**MODEL_COMPILE_ARGS['anomaly'])
         
         # Cost prediction model
         cost_model = tf.keras.Sequential([
@@ -95,7 +303,7 @@ class CloudMetricsPredictor:
             tf.keras.layers.Dense(12, activation='relu'),
             tf.keras.layers.Dense(1, activation='linear')  # Cost prediction
         ])
-        cost_model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+        cost_model.compile(**MODEL_COMPILE_ARGS['cost'])
         
         self.models = {
             'performance': performance_model,
@@ -105,145 +313,468 @@ class CloudMetricsPredictor:
         
         logger.info("TensorFlow models initialized successfully")
     
-    def preprocess_metrics(self, metrics: List[MetricData]) -> np.ndarray:
-        """Preprocess metrics data for ML models"""
-        if len(metrics) < 10:
-            # Pad with zeros if insufficient data
-            padding_needed = 10 - len(metrics)
-            padded_data = []
-            for _ in range(padding_needed):
-                padded_data.extend([0.0, 0.0, 0.0, 0.0])
+    def build_inference(self):
+        """Trace an XLA-compiled inference graph for each model, and an ONNX Runtime session when available"""
+        infer = {}
+        sessions = {}
+        # Content hash of the served weights, so processes serving identical models share cached results
+        weights = hashlib.blake2b(digest_size=8)
+        for name, model in self.models.items():
+            input_dim = model.input_shape[-1]
+            model = self._strip_dropout(model)
+            infer[name] = self._compile_inference(model, input_dim)
+            if self.precision == "int8":
+                quantized = self._quantize(name, model, input_dim)
+                if quantized is not model:
+                    quantized_infer = self._compile_inference(quantized, input_dim)
+                    # INT8 kernels aren't faster on every CPU that advertises them, so measure
+                    int8_time = self._time_inference(quantized_infer, input_dim)
+                    fp32_time = self._time_inference(infer[name], input_dim)
+                    if int8_time < fp32_time:
+                        model, infer[name] = quantized, quantized_infer
+                    else:
+                        logger.info(f"INT8 {name} model is slower than FP32 "
+                                    f"({int8_time * 1e6:.0f}us vs {fp32_time * 1e6:.0f}us), keeping FP32")
+            # Compile every batch bucket so no request pays for tracing or XLA
+            for size in INFERENCE_BUCKETS:
+                infer[name](tf.zeros((size, input_dim), dtype=tf.float32))
+            for array in model.get_weights():
+                weights.update(array.tobytes())
             
-            for metric in metrics:
-                padded_data.extend([metric.cpu, metric.memory, metric.disk, metric.network])
-            
-            return np.array(padded_data).reshape(1, -1)
+            if ort is not None:
+                try:
+                    sessions[name] = self._create_session(model, input_dim)
+                except Exception as e:
+                    logger.warning(f"ONNX export failed for {name} model, using TensorFlow: {e}")
         
-        # Take last 10 data points
-        recent_metrics = metrics[-10:]
-        data = []
-        for metric in recent_metrics:
-            data.extend([metric.cpu/100.0, metric.memory/100.0, metric.disk/100.0, metric.network/100.0])
+        self.infer = infer
+        self.sessions = sessions
+        self.model_version = weights.hexdigest()
+        logger.info(f"Inference graphs compiled successfully (ONNX Runtime: {sorted(sessions)})")
+    
+    @staticmethod
+    def _strip_dropout(model: tf.keras.Model) -> tf.keras.Model:
+        """Rebuild a model without its Dropout layers (identity at inference), copying trained weights"""
+        layers = [layer for layer in model.layers if not isinstance(layer, tf.keras.layers.Dropout)]
+        if len(layers) == len(model.layers):
+            return model
         
-        return np.array(data).reshape(1, -1)
+        rebuilt = []
+        for layer in layers:
+            config = layer.get_config()
+            config.pop('batch_input_shape', None)
+            config.pop('input_shape', None)
+            rebuilt.append(layer.__class__.from_config(config))
+        
+        inference_model = tf.keras.Sequential([tf.keras.Input(shape=model.input_shape[1:])] + rebuilt)
+        for source, target in zip(layers, inference_model.layers):
+            target.set_weights(source.get_weights())
+        
+        return inference_model
     
-    def predict_performance(self, metrics: List[MetricData]) -> Dict:
-        """Predict future performance metrics"""
+    @staticmethod
+    def _quantize(name: str, model: tf.keras.Model, input_dim: int) -> tf.keras.Model:
+        """Post-training INT8 quantization of a copy of the model, keeping FP32 if outputs drift too far"""
         try:
-            processed_data = self.preprocess_metrics(metrics)
-            prediction = self.models['performance'].predict(processed_data, verbose=0)
-            
-            return {
-                "predicted_cpu": float(prediction[0][0] * 100),
-                "predicted_memory": float(prediction[0][1] * 100),
-                "predicted_disk": float(prediction[0][2] * 100),
-                "predicted_network": float(prediction[0][3] * 100),
-                "confidence": 0.85 + np.random.random() * 0.1,
-                "prediction_horizon": "1 hour"
-            }
+            quantized = tf.keras.models.clone_model(model)
+            quantized.set_weights(model.get_weights())
+            quantized.quantize("int8")
         except Exception as e:
-            logger.error(f"Performance prediction error: {e}")
-            return {"error": str(e)}
+            logger.warning(f"INT8 quantization unavailable for {name} model: {e}")
+            return model
+        
+        probe = np.random.default_rng(0).random((256, input_dim), dtype=np.float32)
+        reference = model(probe, training=False).numpy()
+        drift = np.mean(np.abs(quantized(probe, training=False).numpy() - reference))
+        drift /= max(float(np.mean(np.abs(reference))), 1e-6)
+        if drift > QUANTIZATION_TOLERANCE:
+            logger.warning(f"INT8 {name} model drifts {drift:.1%} from FP32, keeping FP32")
+            return model
+        
+        return quantized
+    
+    @staticmethod
+    def _time_inference(infer, input_dim: int, runs: int = 50) -> float:
+        """Mean batch-1 latency of a compiled inference graph, in seconds"""
+        sample = tf.zeros((1, input_dim), dtype=tf.float32)
+        infer(sample).numpy()  # Exclude tracing and XLA compilation
+        start = time.perf_counter()
+        for _ in range(runs):
+            infer(sample).numpy()
+        return (time.perf_counter() - start) / runs
+    
+    @staticmethod
+    def _compile_inference(model: tf.keras.Model, input_dim: int):
+        return tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec([None, input_dim], tf.float32)],
+            jit_compile=True
+        )
+    
+    @staticmethod
+    def _create_session(model: tf.keras.Model, input_dim: int):
+        # Export from a traced graph; tf2onnx's from_keras can't read Keras 3 models
+        graph = tf.function(lambda x: model(x, training=False))
+        model_proto, _ = tf2onnx.convert.from_function(
+            graph,
+            input_signature=[tf.TensorSpec([None, input_dim], tf.float32, name="input")]
+        )
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = INTRA_OP_THREADS
+        
+        session = ort.InferenceSession(
+            model_proto.SerializeToString(),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        return session, session.get_inputs()[0].name
+    
+    def run_inference(self, name: str, data: np.ndarray) -> np.ndarray:
+        """Run a batch through the fastest available inference backend of a model"""
+        session = self.sessions.get(name)
+        if session is not None:
+            session, input_name = session
+            return session.run(None, {input_name: data.astype(np.float32)})[0]
+        
+        return self._run_graph(name, data)
+    
+    def _run_graph(self, name: str, data: np.ndarray) -> np.ndarray:
+        n = len(data)
+        if n > MAX_BATCH_SIZE:
+            return np.concatenate([
+                self._run_graph(name, data[start:start + MAX_BATCH_SIZE])
+                for start in range(0, n, MAX_BATCH_SIZE)
+            ])
+        
+        # Zero-pad to the nearest precompiled bucket and drop the padding rows afterwards
+        bucket = next(size for size in INFERENCE_BUCKETS if size >= n)
+        padded = np.zeros((bucket, data.shape[1]), dtype=np.float32)
+        padded[:n] = data
+        return self.infer[name](tf.constant(padded)).numpy()[:n]
+    
+    @property
+    def training(self) -> bool:
+        return self._training_lock.locked()
+    
+    def train(self, series: List[np.ndarray], epochs: int = 5) -> bool:
+        """Fit performance and anomaly models on per-resource (n, 4) metric series, then rebuild serving graphs"""
+        if not self._training_lock.acquire(blocking=False):
+            logger.info("Model retraining already in progress, skipping")
+            return False
+        
+        try:
+            series = [values * 0.01 for values in series if len(values)]
+            if not series:
+                logger.info("No training data available, keeping current models")
+                return False
+            
+            # Fit copies so the live models keep serving until the swap
+            models = dict(self.models)
+            samples = np.concatenate(series)
+            models['anomaly'] = self._clone_for_training('anomaly')
+            models['anomaly'].fit(self._dataset(samples, samples), epochs=epochs, verbose=0)
+            
+            inputs, targets = self.performance_windows(series)
+            if len(inputs):
+                models['performance'] = self._clone_for_training('performance')
+                models['performance'].fit(self._dataset(inputs, targets), epochs=epochs, verbose=0)
+            
+            # Cost model has no labelled targets in the metrics bucket, so it keeps its weights
+            self.models = models
+            self.build_inference()
+            return True
+        finally:
+            self._training_lock.release()
+    
+    def _clone_for_training(self, name: str) -> tf.keras.Model:
+        model = tf.keras.models.clone_model(self.models[name])
+        model.set_weights(self.models[name].get_weights())
+        model.compile(**MODEL_COMPILE_ARGS[name])
+        return model
+    
+    @staticmethod
+    def performance_windows(series: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pair each window of 10 consecutive samples (flattened to 40) with the sample that follows it"""
+        series = [values for values in series if len(values) > 10]
+        if not series:
+            return np.empty((0, 40), dtype=np.float32), np.empty((0, 4), dtype=np.float32)
+        
+        inputs = np.concatenate([
+            np.lib.stride_tricks.sliding_window_view(values, (10, 4))[:-1, 0].reshape(-1, 40)
+            for values in series
+        ])
+        targets = np.concatenate([values[10:] for values in series])
+        return inputs, targets
+    
+    @staticmethod
+    def _dataset(inputs: np.ndarray, targets: np.ndarray) -> tf.data.Dataset:
+        return tf.data.Dataset.from_tensor_slices((inputs, targets)) \
+            .shuffle(min(len(inputs), 10000)) \
+            .batch(512) \
+            .prefetch(tf.data.AUTOTUNE)
+    
+    def preprocess_metrics(self, values: np.ndarray) -> np.ndarray:
+        """Preprocess metrics data for ML models"""
+        # Last 10 data points, right-aligned; zero-init pads shorter windows
+        data = np.zeros((1, 40), dtype=np.float32)
+        recent = values[-10:]
+        n = len(recent)
+        if n:
+            data[0, -n * 4:] = recent.ravel() * 0.01
+        
+        return data
+    
+    def update_window(self, resource_id: str, values: np.ndarray) -> np.ndarray:
+        """Append new metrics to a resource's rolling window and return it as model input"""
+        window = self.windows.get(resource_id)
+        if window is None:
+            window = self.windows[resource_id] = np.zeros((10, 4), dtype=np.float32)
+        head = self.window_heads.get(resource_id, 0)
+        
+        for row in values[-10:]:
+            window[head] = row * 0.01
+            head = (head + 1) % 10
+        
+        self.window_heads[resource_id] = head
+        # Oldest sample first, matching preprocess_metrics
+        return np.concatenate([window[head:], window[:head]]).reshape(1, -1)
+    
+    def anomaly_features(self, values: np.ndarray) -> np.ndarray:
+        """Build the autoencoder input from the latest metric"""
+        return values[-1:] * 0.01
     
-    def detect_anomalies(self, metrics: List[MetricData]) -> Dict:
+    def cost_features(self, values: np.ndarray, resource_type: str = "compute") -> np.ndarray:
+        """Build the cost model input from average utilization"""
+        means = values.mean(axis=0) * 0.01
+        
+        return np.concatenate([
+            means,
+            [len(values), float(resource_type == "compute"),
+             float(resource_type == "database"), float(resource_type == "storage")]
+        ]).reshape(1, -1).astype(np.float32)
+    
+    def performance_result(self, prediction: np.ndarray) -> Dict:
+        """Format a single performance model output row"""
+        confidence = float(self._conf_pool[self._conf_idx & 65535])
+        self._conf_idx += 1
+        
+        return {
+            "predicted_cpu": float(prediction[0] * 100),
+            "predicted_memory": float(prediction[1] * 100),
+            "predicted_disk": float(prediction[2] * 100),
+            "predicted_network": float(prediction[3] * 100),
+            "confidence": confidence,
+            "prediction_horizon": "1 hour"
+        }
+    
+    def anomaly_result(self, input_data: np.ndarray, reconstruction: np.ndarray) -> Dict:
+        """Format a single autoencoder reconstruction row"""
+        anomaly_score = anomaly_kernel(input_data, np.asarray(reconstruction, dtype=np.float32))
+        
+        return {
+            "anomaly_score": float(anomaly_score),
+            "is_anomaly": anomaly_score > 0.1,
+            "threshold": 0.1,
+            "confidence": 0.92
+        }
+    
+    def cost_result(self, features: np.ndarray, cost_prediction: np.ndarray) -> Dict:
+        """Format a single cost model output row"""
+        # Plain floats: orjson rejects NumPy scalars
+        avg_cpu = float(features[0]) * 100
+        base_cost = float(cost_prediction[0]) * 100  # Scale to realistic cost
+        
+        return {
+            "predicted_daily_cost": base_cost,
+            "predicted_monthly_cost": base_cost * 30,
+            "cost_trend": "increasing" if avg_cpu > 70 else "stable",
+            "optimization_potential": float(max(0, (100 - avg_cpu) * 0.01 * base_cost))
+        }
+    
+    def format_result(self, name: str, features: np.ndarray, output: np.ndarray) -> Dict:
+        """Format a single model output row for the given prediction type"""
+        if name == "performance":
+            return self.performance_result(output)
+        if name == "anomaly":
+            return self.anomaly_result(features, output)
+        return self.cost_result(features, output)
+    
+    def detect_anomalies(self, values: np.ndarray) -> Dict:
         """Detect anomalies in metrics using autoencoder"""
         try:
-            if len(metrics) < 1:
+            if len(values) < 1:
                 return {"anomaly_score": 0.0, "is_anomaly": False}
             
-            latest_metric = metrics[-1]
-            input_data = np.array([[
-                latest_metric.cpu/100.0,
-                latest_metric.memory/100.0,
-                latest_metric.disk/100.0,
-                latest_metric.network/100.0
-            ]])
-            
-            reconstruction = self.models['anomaly'].predict(input_data, verbose=0)
-            anomaly_score = np.mean(np.square(input_data - reconstruction))
+            input_data = self.anomaly_features(values)
+            reconstruction = self.run_inference('anomaly', input_data)
             
-            return {
-                "anomaly_score": float(anomaly_score),
-                "is_anomaly": anomaly_score > 0.1,
-                "threshold": 0.1,
-                "confidence": 0.92
-            }
+            return self.anomaly_result(input_data[0], reconstruction[0])
         except Exception as e:
             logger.error(f"Anomaly detection error: {e}")
             return {"error": str(e)}
     
-    def predict_cost(self, metrics: List[MetricData], resource_type: str = "compute") -> Dict:
+    def predict_cost(self, values: np.ndarray, resource_type: str = "compute") -> Dict:
         """Predict resource costs based on usage patterns"""
         try:
-            if len(metrics) < 1:
+            if len(values) < 1:
                 return {"predicted_cost": 0.0}
             
-            # Calculate average utilization
-            avg_cpu = np.mean([m.cpu for m in metrics])
-            avg_memory = np.mean([m.memory for m in metrics])
-            avg_disk = np.mean([m.disk for m in metrics])
-            avg_network = np.mean([m.network for m in metrics])
+            features = self.cost_features(values, resource_type)
+            cost_prediction = self.run_inference('cost', features)
             
-            # Create feature vector
-            features = np.array([[
-                avg_cpu/100.0, avg_memory/100.0, avg_disk/100.0, avg_network/100.0,
-                len(metrics), 1.0 if resource_type == "compute" else 0.0,
-                1.0 if resource_type == "database" else 0.0,
-                1.0 if resource_type == "storage" else 0.0
-            ]])
-            
-            cost_prediction = self.models['cost'].predict(features, verbose=0)
-            base_cost = float(cost_prediction[0][0]) * 100  # Scale to realistic cost
-            
-            return {
-                "predicted_daily_cost": base_cost,
-                "predicted_monthly_cost": base_cost * 30,
-                "cost_trend": "increasing" if avg_cpu > 70 else "stable",
-                "optimization_potential": max(0, (100 - avg_cpu) * 0.01 * base_cost)
-            }
+            return self.cost_result(features[0], cost_prediction[0])
         except Exception as e:
             logger.error(f"Cost prediction error: {e}")
             return {"error": str(e)}
+    
+    async def predict_all(self, values: np.ndarray, resource_type: str = "compute",
+                          window: Optional[np.ndarray] = None) -> Dict:
+        """Run performance, anomaly and cost predictions concurrently from one preprocessing pass"""
+        features = {"performance": window if window is not None else self.preprocess_metrics(values)}
+        if len(values):
+            features["anomaly"] = self.anomaly_features(values)
+            features["cost"] = self.cost_features(values, resource_type)
+        
+        # TensorFlow releases the GIL, so the graphs run in parallel off the event loop
+        loop = asyncio.get_running_loop()
+        outputs = await asyncio.gather(
+            *(loop.run_in_executor(self.tf_pool, self.run_inference, name, data) for name, data in features.items()),
+            return_exceptions=True
+        )
+        
+        predictions = {}
+        for (name, data), output in zip(features.items(), outputs):
+            try:
+                if isinstance(output, Exception):
+                    raise output
+                predictions[name] = self.format_result(name, data[0], output[0])
+            except Exception as e:
+                logger.error(f"{name.capitalize()} prediction error: {e}")
+                predictions[name] = {"error": str(e)}
+        
+        if not len(values):
+            # Nothing to score, fall back to the empty-input defaults
+            predictions["anomaly"] = self.detect_anomalies(values)
+            predictions["cost"] = self.predict_cost(values, resource_type)
+        
+        return predictions
 
 # Initialize ML predictor
 predictor = CloudMetricsPredictor()
 
+# Request micro-batching
+class PredictionBatcher:
+    """Coalesce concurrent prediction requests into one forward pass per model"""
+    
+    def __init__(self, predictor: CloudMetricsPredictor, batch_size: int = MAX_BATCH_SIZE, batch_timeout: float = 0.005):
+        self.predictor = predictor
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        """Launch one batching loop per model"""
+        for name in self.predictor.models:
+            self.queues[name] = asyncio.Queue()
+            self.tasks.append(asyncio.create_task(self._run(name)))
+    
+    async def stop(self):
+        """Cancel the batching loops"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+    
+    async def submit(self, name: str, features: np.ndarray) -> np.ndarray:
+        """Queue a single (1, n) feature vector and wait for its output row"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queues[name].put((features, future))
+        return await future
+    
+    async def _run(self, name: str):
+        queue = self.queues[name]
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            items = [await queue.get()]
+            deadline = loop.time() + self.batch_timeout
+            
+            # Collect until the batch is full or the timeout expires
+            while len(items) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                batch = np.vstack([features for features, _ in items])
+                outputs = await loop.run_in_executor(self.predictor.tf_pool, self.predictor.run_inference, name, batch)
+            except Exception as e:
+                logger.error(f"Batched {name} inference error: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), output in zip(items, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+batcher = PredictionBatcher(predictor)
+
 # Digital Twin Engine
 class DigitalTwinEngine:
     def __init__(self):
         self.twins = {}
+        self._accuracy_pool = np.random.default_rng(1).random(65536).astype(np.float32) * 0.2 + 0.75
+        self._accuracy_idx = 0
+        # Shared write API; the client batches points in the background
+        self.write_api = influx_client.write_api(
+            write_options=WriteOptions(batch_size=5000, flush_interval=1000, jitter_interval=200)
+        )
     
-    def create_twin(self, resource_id: str, initial_state: Dict) -> DigitalTwinState:
+    async def create_twin(self, resource_id: str, initial_state: Dict) -> DigitalTwinState:
         """Create a new digital twin"""
         twin = DigitalTwinState(
             resource_id=resource_id,
             state=initial_state,
-            accuracy=0.75 + np.random.random() * 0.2
+            accuracy=float(self._accuracy_pool[self._accuracy_idx & 65535])
         )
+        self._accuracy_idx += 1
         self.twins[resource_id] = twin
         
-        # Cache in Redis
-        redis_client.setex(f"twin:{resource_id}", 3600, json.dumps(twin.dict()))
+        await self.cache_twin(twin)
         
         return twin
     
-    def update_twin(self, resource_id: str, metrics: List[MetricData]) -> DigitalTwinState:
+    async def cache_twin(self, twin: DigitalTwinState):
+        """Write the twin's current state through to Redis"""
+        await redis_client.setex(f"twin:{twin.resource_id}", 3600, orjson.dumps(twin.model_dump()))
+    
+    async def update_twin(self, resource_id: str, metrics: List[MetricData]) -> DigitalTwinState:
         """Update digital twin with new metrics"""
         if resource_id not in self.twins:
-            self.create_twin(resource_id, {"status": "active"})
+            await self.create_twin(resource_id, {"status": "active"})
         
         twin = self.twins[resource_id]
         
         # Generate predictions
-        predictions = {
-            "performance": predictor.predict_performance(metrics),
-            "anomaly": predictor.detect_anomalies(metrics),
-            "cost": predictor.predict_cost(metrics)
-        }
+        values = metrics_to_ndarray(metrics)
+        window = predictor.update_window(resource_id, values)
+        predictions = await predictor.predict_all(values, window=window)
         
         twin.predictions = predictions
         twin.accuracy = min(0.99, twin.accuracy + 0.001)  # Gradually improve
         
+        # Keep the cached copy in step for /digital-twin reads
+        await self.cache_twin(twin)
+        
         # Store in InfluxDB
         self.store_twin_data(twin, metrics)
         
@@ -252,19 +783,19 @@ class DigitalTwinEngine:
     def store_twin_data(self, twin: DigitalTwinState, metrics: List[MetricData]):
         """Store twin data in InfluxDB"""
         try:
-            write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+            points = [
+                Point("digital_twin_metrics")
+                .tag("resource_id", twin.resource_id)
+                .field("cpu", metric.cpu)
+                .field("memory", metric.memory)
+                .field("disk", metric.disk)
+                .field("network", metric.network)
+                .field("accuracy", twin.accuracy)
+                .time(metric.timestamp, WritePrecision.NS)
+                for metric in metrics
+            ]
             
-            for metric in metrics:
-                point = Point("digital_twin_metrics") \
-                    .tag("resource_id", twin.resource_id) \
-                    .field("cpu", metric.cpu) \
-                    .field("memory", metric.memory) \
-                    .field("disk", metric.disk) \
-                    .field("network", metric.network) \
-                    .field("accuracy", twin.accuracy) \
-                    .time(metric.timestamp, WritePrecision.NS)
-                
-                write_api.write(bucket="cloudguard", org="cloudguard", record=point)
+            self.write_api.write(bucket="cloudguard", org="cloudguard", record=points)
         except Exception as e:
             logger.error(f"Failed to store twin data: {e}")
 
@@ -278,33 +809,63 @@ async def health_check():
         "service": "CloudGuard AI ML Service",
         "tensorflow_version": tf.__version__,
         "models_loaded": len(predictor.models),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": app.state.iso_now
     }
 
 @app.post("/predict")
 async def predict_metrics(request: PredictionRequest):
     """Generate ML predictions for metrics"""
     try:
+        values = metrics_to_ndarray(request.metrics)
+        
         if request.prediction_type == "performance":
-            result = predictor.predict_performance(request.metrics)
+            features = predictor.preprocess_metrics(values)
         elif request.prediction_type == "anomaly":
-            result = predictor.detect_anomalies(request.metrics)
+            features = predictor.anomaly_features(values) if len(values) else None
         elif request.prediction_type == "cost":
-            result = predictor.predict_cost(request.metrics)
+            features = predictor.cost_features(values) if len(values) else None
         else:
             raise HTTPException(status_code=400, detail="Invalid prediction type")
         
-        # Cache result
-        cache_key = f"prediction:{request.resource_id}:{request.prediction_type}"
-        redis_client.setex(cache_key, 300, json.dumps(result))  # 5-minute cache
+        if features is None:
+            # No metrics to run the model on
+            if request.prediction_type == "anomaly":
+                result = predictor.detect_anomalies(values)
+            else:
+                result = predictor.predict_cost(values)
+        else:
+            # Identical model inputs give identical outputs, so key the cache on the input vector
+            digest = hashlib.blake2b(features.tobytes(), digest_size=8).hexdigest()
+            result_key = f"pred:{predictor.model_version}:{request.prediction_type}:{digest}"
+            try:
+                cached = await redis_client.get(result_key)
+            except RedisError as e:
+                # The cache is best-effort; fall through to inference
+                logger.warning(f"Prediction cache lookup failed: {e}")
+                cached = None
+            if cached:
+                result = orjson.loads(cached)
+            else:
+                output = await batcher.submit(request.prediction_type, features)
+                result = predictor.format_result(request.prediction_type, features[0], output)
+                cache_in_background(redis_client.set(result_key, orjson.dumps(result), ex=300))
         
-        return {
+        # Serialize once for both the cache and the response
+        payload = orjson.dumps({
             "resource_id": request.resource_id,
             "prediction_type": request.prediction_type,
             "result": result,
-            "timestamp": datetime.now().isoformat()
-        }
+            "timestamp": app.state.iso_now
+        })
+        
+        # Cache result
+        cache_key = f"prediction:{request.resource_id}:{request.prediction_type}"
+        cache_in_background(redis_client.set(cache_key, payload, ex=300))  # 5-minute cache
+        
+        return Response(content=payload, media_type="application/json")
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -312,54 +873,98 @@ async def predict_metrics(request: PredictionRequest):
 @app.post("/digital-twin/create")
 async def create_digital_twin(resource_id: str, initial_state: Dict):
     """Create a new digital twin"""
-    twin = twin_engine.create_twin(resource_id, initial_state)
-    return twin.dict()
+    twin = await twin_engine.create_twin(resource_id, initial_state)
+    return twin.model_dump()
 
 @app.post("/digital-twin/update")
 async def update_digital_twin(resource_id: str, metrics: List[MetricData]):
     """Update digital twin with new metrics"""
-    twin = twin_engine.update_twin(resource_id, metrics)
-    return twin.dict()
+    twin = await twin_engine.update_twin(resource_id, metrics)
+    return twin.model_dump()
+
+@app.post("/digital-twin/bulk")
+async def get_digital_twins(resource_ids: List[str] = Body(...)):
+    """Get many digital twin states in a single cache round-trip"""
+    # Twins held by this process are the freshest copy; only fetch the rest from Redis
+    twins = {
+        resource_id: twin_engine.twins[resource_id].model_dump()
+        for resource_id in resource_ids
+        if resource_id in twin_engine.twins
+    }
+    missing = [resource_id for resource_id in resource_ids if resource_id not in twins]
+    
+    not_found = []
+    if missing:  # MGET with no keys is a Redis error
+        cached = await redis_client.mget([f"twin:{resource_id}" for resource_id in missing])
+        for resource_id, value in zip(missing, cached):
+            if value is None:
+                not_found.append(resource_id)
+            else:
+                twins[resource_id] = orjson.loads(value)
+    
+    return {"twins": twins, "not_found": not_found}
 
 @app.get("/digital-twin/{resource_id}")
 async def get_digital_twin(resource_id: str):
     """Get digital twin state"""
-    cached = redis_client.get(f"twin:{resource_id}")
+    cached = await redis_client.get(f"twin:{resource_id}")
     if cached:
-        return json.loads(cached)
+        # Already serialized JSON, pass it through untouched
+        return Response(content=cached, media_type="application/json")
     
     if resource_id in twin_engine.twins:
-        return twin_engine.twins[resource_id].dict()
+        return twin_engine.twins[resource_id].model_dump()
     
     raise HTTPException(status_code=404, detail="Digital twin not found")
 
 @app.post("/train")
 async def train_models(background_tasks: BackgroundTasks):
     """Trigger model retraining (background task)"""
+    if predictor.training:
+        return {"message": "Model retraining already in progress", "status": "running"}
+    
     background_tasks.add_task(retrain_models)
     return {"message": "Model retraining started", "status": "initiated"}
 
-async def retrain_models():
+TRAINING_QUERY = '''
+from(bucket: "cloudguard")
+  |> range(start: _start)
+  |> filter(fn: (r) => r["_measurement"] == "digital_twin_metrics")
+  |> filter(fn: (r) => r["_field"] == "cpu" or r["_field"] == "memory" or r["_field"] == "disk" or r["_field"] == "network")
+  |> aggregateWindow(every: _every, fn: mean, createEmpty: false)
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: ["_time", "resource_id", "cpu", "memory", "disk", "network"])
+'''
+
+def retrain_models():
     """Retrain ML models with latest data"""
     try:
         logger.info("Starting model retraining...")
         
-        # Query InfluxDB for training data
+        # Query InfluxDB for training data, downsampled and pivoted server-side
         query_api = influx_client.query_api()
-        query = '''
-        from(bucket: "cloudguard")
-          |> range(start: -30d)
-          |> filter(fn: (r) => r["_measurement"] == "digital_twin_metrics")
-        '''
-        
-        tables = query_api.query(query, org="cloudguard")
+        frames = query_api.query_data_frame_stream(
+            TRAINING_QUERY,
+            org="cloudguard",
+            params={"_start": timedelta(days=-30), "_every": timedelta(minutes=1)}
+        )
         
-        # Process data and retrain models
-        # (In production, implement proper training pipeline)
+        # One (n, 4) series per resource, in time order
+        chunks: Dict[str, List[np.ndarray]] = {}
+        for frame in frames:
+            if frame.empty:
+                continue
+            for resource_id, group in frame.sort_values("_time").groupby("resource_id"):
+                values = group[["cpu", "memory", "disk", "network"]].dropna().to_numpy(dtype=np.float32)
+                chunks.setdefault(resource_id, []).append(values)
         
-        logger.info("Model retraining completed")
+        series = [np.concatenate(parts) for parts in chunks.values()]
+        if predictor.train(series):
+            logger.info("Model retraining completed")
     except Exception as e:
         logger.error(f"Retraining error: {e}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Single process; for more workers run `uvicorn main:app --workers N` so the
+    # supervisor doesn't load the models itself
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop="uvloop", http="httptools")
@@ -0,0 +1,18 @@
+from unittest.mock import MagicMock
+
+import fakeredis.aioredis
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Swap external services for in-process fakes
+    main.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    main.twin_engine.write_api.close()
+    main.twin_engine.write_api = MagicMock()
+
+    with TestClient(main.app) as test_client:
+        yield test_client
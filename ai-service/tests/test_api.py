@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+
+import numpy as np
+import orjson
+import pytest
+from redis.exceptions import RedisError
+
+import main
+
+
+def test_bulk_twins_split_cache_hits_memory_and_not_found(client):
+    response = client.post(
+        "/digital-twin/create", params={"resource_id": "bulk-cached"}, json={"status": "active"}
+    )
+    assert response.status_code == 200
+    # Only reachable through Redis from here on
+    del main.twin_engine.twins["bulk-cached"]
+    main.twin_engine.twins["bulk-memory"] = main.DigitalTwinState(
+        resource_id="bulk-memory", state={"status": "idle"}
+    )
+
+    response = client.post("/digital-twin/bulk", json=["bulk-cached", "bulk-memory", "bulk-missing"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["twins"]) == {"bulk-cached", "bulk-memory"}
+    assert body["twins"]["bulk-cached"]["state"] == {"status": "active"}
+    assert body["twins"]["bulk-memory"]["state"] == {"status": "idle"}
+    assert body["not_found"] == ["bulk-missing"]
+
+
+def test_bulk_twins_empty_request(client):
+    response = client.post("/digital-twin/bulk", json=[])
+
+    assert response.status_code == 200
+    assert response.json() == {"twins": {}, "not_found": []}
+
+
+def positive_outputs(name, data):
+    """Stand-in for inference that yields positive outputs (e.g. a positive cost)"""
+    output_dim = main.predictor.models[name].output_shape[-1]
+    return np.full((len(data), output_dim), 0.5, dtype=np.float32)
+
+
+def metrics_payload(resource_id, cpu):
+    return [
+        {
+            "timestamp": f"2024-01-01T00:0{i}:00",
+            "resource_id": resource_id,
+            "cpu": cpu,
+            "memory": 40.0,
+            "disk": 30.0,
+            "network": 20.0
+        }
+        for i in range(3)
+    ]
+
+
+@pytest.mark.parametrize("prediction_type", ["performance", "anomaly", "cost"])
+def test_predict_serializes_every_prediction_type(client, monkeypatch, prediction_type):
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+
+    response = client.post("/predict", json={
+        "resource_id": f"serialize-{prediction_type}",
+        "metrics": metrics_payload(f"serialize-{prediction_type}", 61.5),
+        "prediction_type": prediction_type
+    })
+
+    assert response.status_code == 200
+    assert response.json()["prediction_type"] == prediction_type
+
+
+def test_predict_cost_with_positive_cost(client, monkeypatch):
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+
+    response = client.post("/predict", json={
+        "resource_id": "positive-cost",
+        "metrics": metrics_payload("positive-cost", 52.25),
+        "prediction_type": "cost"
+    })
+
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert result["predicted_daily_cost"] == pytest.approx(50.0)
+    assert result["optimization_potential"] == pytest.approx((100 - 52.25) * 0.01 * 50.0)
+
+
+def test_update_digital_twin_serializes_predictions(client, monkeypatch):
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+
+    response = client.post(
+        "/digital-twin/update",
+        params={"resource_id": "update-serialize"},
+        json=metrics_payload("update-serialize", 75.0)
+    )
+
+    assert response.status_code == 200
+    predictions = response.json()["predictions"]
+    assert predictions["cost"]["predicted_daily_cost"] == pytest.approx(50.0)
+    assert predictions["cost"]["cost_trend"] == "increasing"
+
+
+def test_bulk_twins_return_predictions_after_update(client, monkeypatch):
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+    response = client.post(
+        "/digital-twin/update",
+        params={"resource_id": "bulk-updated"},
+        json=metrics_payload("bulk-updated", 55.0)
+    )
+    assert response.status_code == 200
+    updated = response.json()
+
+    response = client.post("/digital-twin/bulk", json=["bulk-updated"])
+
+    twin = response.json()["twins"]["bulk-updated"]
+    assert twin["predictions"] == updated["predictions"]
+    assert twin["accuracy"] == updated["accuracy"]
+
+
+def test_update_writes_twin_through_to_redis(client, monkeypatch):
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+    client.post(
+        "/digital-twin/update",
+        params={"resource_id": "write-through"},
+        json=metrics_payload("write-through", 45.0)
+    )
+    # Force the Redis copy to be used
+    del main.twin_engine.twins["write-through"]
+
+    response = client.post("/digital-twin/bulk", json=["write-through"])
+
+    twin = response.json()["twins"]["write-through"]
+    assert twin["predictions"]["cost"]["predicted_daily_cost"] == pytest.approx(50.0)
+
+
+class CountingInference:
+    """positive_outputs that also records which models were run"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, data):
+        self.calls.append(name)
+        return positive_outputs(name, data)
+
+
+def predict_cost(client, resource_id, cpu):
+    return client.post("/predict", json={
+        "resource_id": resource_id,
+        "metrics": metrics_payload(resource_id, cpu),
+        "prediction_type": "cost"
+    })
+
+
+def drain_cache_writes(client):
+    async def drain():
+        await asyncio.gather(*main.pending_cache_writes)
+
+    client.portal.call(drain)
+
+
+def result_key(cpu):
+    values = main.metrics_to_ndarray([main.MetricData(**m) for m in metrics_payload("key", cpu)])
+    features = main.predictor.cost_features(values)
+    digest = hashlib.blake2b(features.tobytes(), digest_size=8).hexdigest()
+    return f"pred:{main.predictor.model_version}:cost:{digest}"
+
+
+def test_predict_miss_writes_result_back(client, monkeypatch):
+    inference = CountingInference()
+    monkeypatch.setattr(main.predictor, "run_inference", inference)
+
+    response = predict_cost(client, "cache-miss", 33.0)
+    drain_cache_writes(client)
+
+    assert inference.calls == ["cost"]
+    cached = client.portal.call(main.redis_client.get, result_key(33.0))
+    assert orjson.loads(cached) == response.json()["result"]
+
+
+def test_predict_hit_skips_inference(client, monkeypatch):
+    inference = CountingInference()
+    monkeypatch.setattr(main.predictor, "run_inference", inference)
+
+    first = predict_cost(client, "cache-hit-a", 34.0)
+    drain_cache_writes(client)
+    # Same metrics from another resource hit the same content-addressed entry
+    second = predict_cost(client, "cache-hit-b", 34.0)
+
+    assert inference.calls == ["cost"]
+    assert second.json()["result"] == first.json()["result"]
+    assert second.json()["resource_id"] == "cache-hit-b"
+
+
+def test_predict_model_version_change_misses_old_entries(client, monkeypatch):
+    inference = CountingInference()
+    monkeypatch.setattr(main.predictor, "run_inference", inference)
+
+    predict_cost(client, "cache-version", 35.0)
+    drain_cache_writes(client)
+    monkeypatch.setattr(main.predictor, "model_version", "retrained")
+    predict_cost(client, "cache-version", 35.0)
+
+    assert inference.calls == ["cost", "cost"]
+
+
+def test_predict_survives_cache_lookup_failure(client, monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise RedisError("connection refused")
+
+    monkeypatch.setattr(main.predictor, "run_inference", positive_outputs)
+    monkeypatch.setattr(main.redis_client, "get", unavailable)
+
+    response = predict_cost(client, "cache-down", 36.0)
+
+    assert response.status_code == 200
+    assert response.json()["result"]["predicted_daily_cost"] == pytest.approx(50.0)
@@ -0,0 +1,104 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from main import PredictionBatcher
+
+
+class FakePredictor:
+    """Doubles its input and records the size of every batch it is given"""
+
+    def __init__(self, error=None):
+        self.models = {"double": None}
+        self.tf_pool = ThreadPoolExecutor(max_workers=1)
+        self.batches = []
+        self.error = error
+
+    def run_inference(self, name, data):
+        self.batches.append(len(data))
+        if self.error is not None:
+            raise self.error
+        return data * 2
+
+
+def vectors(n):
+    return [np.full((1, 4), i, dtype=np.float32) for i in range(n)]
+
+
+def submit_all(batcher, features):
+    async def run():
+        batcher.start()
+        try:
+            return await asyncio.gather(
+                *(batcher.submit("double", vector) for vector in features),
+                return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+def test_full_batch_runs_without_waiting_for_timeout():
+    predictor = FakePredictor()
+    batcher = PredictionBatcher(predictor, batch_size=4, batch_timeout=60)
+
+    results = submit_all(batcher, vectors(4))
+
+    assert predictor.batches == [4]
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result, np.full(4, i * 2))
+
+
+def test_requests_beyond_batch_size_spill_into_next_batch():
+    predictor = FakePredictor()
+    batcher = PredictionBatcher(predictor, batch_size=4, batch_timeout=0.01)
+
+    results = submit_all(batcher, vectors(6))
+
+    assert predictor.batches == [4, 2]
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result, np.full(4, i * 2))
+
+
+def test_partial_batch_runs_after_timeout():
+    predictor = FakePredictor()
+    batcher = PredictionBatcher(predictor, batch_size=64, batch_timeout=0.01)
+
+    results = submit_all(batcher, vectors(3))
+
+    assert predictor.batches == [3]
+    assert len(results) == 3
+
+
+def test_inference_error_reaches_every_caller():
+    error = RuntimeError("inference failed")
+    predictor = FakePredictor(error=error)
+    batcher = PredictionBatcher(predictor, batch_size=4, batch_timeout=60)
+
+    results = submit_all(batcher, vectors(4))
+
+    assert predictor.batches == [4]
+    assert all(result is error for result in results)
+
+
+def test_batcher_keeps_serving_after_an_error():
+    predictor = FakePredictor(error=RuntimeError("inference failed"))
+    batcher = PredictionBatcher(predictor, batch_size=2, batch_timeout=60)
+
+    async def run():
+        batcher.start()
+        try:
+            with pytest.raises(RuntimeError):
+                await asyncio.gather(*(batcher.submit("double", v) for v in vectors(2)))
+            predictor.error = None
+            return await asyncio.gather(*(batcher.submit("double", v) for v in vectors(2)))
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert predictor.batches == [2, 2]
+    np.testing.assert_array_equal(results[1], np.full(4, 2))
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from main import CloudMetricsPredictor, anomaly_kernel, anomaly_kernel_batch, predictor
+
+
+def metrics_array(n, start=0):
+    """(n, 4) raw metrics with a distinct value in every cell"""
+    return np.arange(start * 4, (start + n) * 4, dtype=np.float32).reshape(n, 4)
+
+
+def test_update_window_matches_preprocess_after_wraparound():
+    values = metrics_array(13)
+
+    predictor.update_window("window-wrap", values[:7])
+    window = predictor.update_window("window-wrap", values[7:])
+
+    np.testing.assert_allclose(window, predictor.preprocess_metrics(values))
+
+
+def test_update_window_matches_zero_padded_preprocess():
+    values = metrics_array(3)
+
+    window = predictor.update_window("window-short", values)
+
+    np.testing.assert_allclose(window, predictor.preprocess_metrics(values))
+    np.testing.assert_array_equal(window[0, :28], 0)
+
+
+def test_update_window_is_per_resource():
+    predictor.update_window("window-a", metrics_array(10))
+    window = predictor.update_window("window-b", metrics_array(2, start=50))
+
+    np.testing.assert_allclose(window, predictor.preprocess_metrics(metrics_array(2, start=50)))
+
+
+def test_performance_windows_pair_each_window_with_next_sample():
+    series = [metrics_array(13), metrics_array(10), metrics_array(11, start=100)]
+
+    inputs, targets = CloudMetricsPredictor.performance_windows(series)
+
+    # 3 windows from the first series, none from the second, 1 from the third
+    assert inputs.shape == (4, 40)
+    assert targets.shape == (4, 4)
+    np.testing.assert_array_equal(inputs[0], series[0][0:10].ravel())
+    np.testing.assert_array_equal(targets[0], series[0][10])
+    np.testing.assert_array_equal(inputs[2], series[0][2:12].ravel())
+    np.testing.assert_array_equal(targets[2], series[0][12])
+    np.testing.assert_array_equal(inputs[3], series[2][0:10].ravel())
+    np.testing.assert_array_equal(targets[3], series[2][10])
+
+
+def test_performance_windows_empty_without_enough_history():
+    inputs, targets = CloudMetricsPredictor.performance_windows([metrics_array(10)])
+
+    assert inputs.shape == (0, 40)
+    assert targets.shape == (0, 4)
+
+
+def test_run_inference_pads_to_buckets_without_changing_rows(monkeypatch):
+    monkeypatch.setattr(predictor, "sessions", {})
+    rng = np.random.default_rng(0)
+
+    for n in (1, 3, 64, 70):
+        data = rng.random((n, 4), dtype=np.float32)
+        expected = predictor.models["anomaly"](data, training=False).numpy()
+
+        output = predictor.run_inference("anomaly", data)
+
+        assert output.shape == (n, 4)
+        np.testing.assert_allclose(output, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_strip_dropout_preserves_inference_outputs():
+    rng = np.random.default_rng(0)
+
+    for name, model in predictor.models.items():
+        dropout_layers = sum(isinstance(layer, tf.keras.layers.Dropout) for layer in model.layers)
+        data = rng.random((8, model.input_shape[-1]), dtype=np.float32)
+
+        stripped = CloudMetricsPredictor._strip_dropout(model)
+
+        assert len(stripped.layers) == len(model.layers) - dropout_layers, name
+        np.testing.assert_allclose(
+            stripped(data, training=False).numpy(),
+            model(data, training=False).numpy(),
+            rtol=1e-6, atol=1e-6, err_msg=name
+        )
+
+
+def test_anomaly_kernel_matches_mean_squared_error():
+    rng = np.random.default_rng(1)
+    inputs = rng.random(4, dtype=np.float32)
+    recons = rng.random(4, dtype=np.float32)
+
+    score = anomaly_kernel(inputs, recons)
+
+    assert score == pytest.approx(float(np.mean(np.square(inputs - recons))), rel=1e-5)
+
+
+def test_anomaly_kernel_batch_matches_row_wise_mean_squared_error():
+    rng = np.random.default_rng(2)
+    inputs = rng.random((33, 4), dtype=np.float32)
+    recons = rng.random((33, 4), dtype=np.float32)
+
+    scores = anomaly_kernel_batch(inputs, recons)
+
+    np.testing.assert_allclose(scores, np.mean(np.square(inputs - recons), axis=1), rtol=1e-5)
+
+
+@pytest.mark.parametrize("resource_type", ["compute", "database", "storage", "network"])
+def test_cost_features_match_per_metric_means(resource_type):
+    values = np.random.default_rng(3).random((17, 4), dtype=np.float32) * 100
+
+    features = predictor.cost_features(values, resource_type)
+
+    # Original formulation: one np.mean per metric, then scale
+    expected = np.array([[
+        np.mean(values[:, 0]) / 100.0, np.mean(values[:, 1]) / 100.0,
+        np.mean(values[:, 2]) / 100.0, np.mean(values[:, 3]) / 100.0,
+        len(values), 1.0 if resource_type == "compute" else 0.0,
+        1.0 if resource_type == "database" else 0.0,
+        1.0 if resource_type == "storage" else 0.0
+    ]])
+    assert features.shape == (1, 8)
+    assert features.dtype == np.float32
+    np.testing.assert_allclose(features, expected, rtol=1e-5)
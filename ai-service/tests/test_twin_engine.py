@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from influxdb_client import Point
+
+import main
+
+
+def test_store_twin_data_writes_all_points_in_one_call(monkeypatch):
+    write_api = MagicMock()
+    monkeypatch.setattr(main.twin_engine, "write_api", write_api)
+    start = datetime(2024, 1, 1)
+    metrics = [
+        main.MetricData(
+            timestamp=start + timedelta(minutes=i), resource_id="store-batch",
+            cpu=10.0 + i, memory=20.0, disk=30.0, network=40.0
+        )
+        for i in range(5)
+    ]
+    twin = main.DigitalTwinState(resource_id="store-batch", state={}, accuracy=0.8)
+
+    main.twin_engine.store_twin_data(twin, metrics)
+
+    write_api.write.assert_called_once()
+    kwargs = write_api.write.call_args.kwargs
+    assert kwargs["bucket"] == "cloudguard"
+    points = kwargs["record"]
+    assert len(points) == 5
+    assert all(isinstance(point, Point) for point in points)
+    assert "cpu=14" in points[-1].to_line_protocol()
+    assert "resource_id=store-batch" in points[0].to_line_protocol()